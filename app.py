@@ -1,51 +1,117 @@
 """Streamlit UI — Retention Decision Twin."""
 
 import streamlit as st
-import json
-import chromadb
 import tempfile
 import os
+import shutil
+from html import escape
 from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+
+from config import (
+    CHROMA_COLLECTION,
+    CHROMA_DB_DIR,
+    CHROMA_METADATA,
+    EXAMPLE_LABELS,
+    EXAMPLE_TEXTS,
+    TOP_K,
+)
 
-from config import CHROMA_COLLECTION, TOP_K
-from rag import answer
+# chromadb / rag (Gemini SDK) are imported lazily: Streamlit re-executes this
+# script on every interaction, and neither is needed to paint the page.
+if TYPE_CHECKING:
+    import chromadb
 
 # ─────────────────────────────────────────
-# KB loader (JSON → writable tmp ChromaDB)
+# KB loader (prebuilt chroma_db/ or JSON + .npy → writable tmp ChromaDB)
 # ─────────────────────────────────────────
+@st.cache_data(show_spinner=False)
+def _load_kb_export(path: str, mtime: float) -> dict:
+    """Parsed kb_export.json; `mtime` is only a cache key so edits invalidate it."""
+    import orjson
+    return orjson.loads(Path(path).read_bytes())
+
+
 @st.cache_resource
-def ensure_db():
-    tmp_dir = os.path.join(tempfile.gettempdir(), "chroma_retention")
-    client = chromadb.PersistentClient(path=tmp_dir)
+def ensure_db() -> "tuple[chromadb.ClientAPI, chromadb.Collection]":
+    """Open (and seed if empty) the tmp ChromaDB; the live handles are cached per process."""
+    import chromadb
+    import numpy as np
+
+    # Prefer RAM-backed tmpfs (Linux) so the HNSW index never loads from disk
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    tmp_dir = str(base / "chroma_retention")
+    kb_dir = Path(__file__).parent
+
+    # First start on this host: copy the prebuilt DB shipped in the repo. A
+    # plain file copy, no JSON parse or re-insert; the probe below validates it.
+    prebuilt = kb_dir / CHROMA_DB_DIR
+    if not Path(tmp_dir).exists() and prebuilt.is_dir():
+        shutil.copytree(prebuilt, tmp_dir)
     try:
-        col = client.get_collection(CHROMA_COLLECTION)
-        if col.count() > 0:
-            return tmp_dir
+        client = chromadb.PersistentClient(path=tmp_dir)
     except Exception:
-        pass
-    json_path = Path(__file__).parent / "kb_export.json"
-    with open(json_path) as f:
-        data = json.load(f)
+        # Written by an incompatible Chroma version. Chroma keeps the failed
+        # system cached per path, so seed a sibling dir from JSON instead.
+        tmp_dir += "_json"
+        client = chromadb.PersistentClient(path=tmp_dir)
+    sentinel = Path(tmp_dir) / ".kb_loaded"
+
+    # Seeded by an earlier process: skip the count probe and the JSON parse
+    if sentinel.exists():
+        return client, client.get_collection(CHROMA_COLLECTION)
+    # Membership test rather than try/except, so real errors still surface.
+    # Chroma 0.6 lists bare names, 1.x lists Collection objects.
+    if CHROMA_COLLECTION in {getattr(c, "name", c) for c in client.list_collections()}:
+        col = client.get_collection(CHROMA_COLLECTION)
+        n = col.count()
+        if n > 0:
+            # The shipped chroma_db/ predates the pinned HNSW settings. Its
+            # M / construction_ef already match, but search_ef is a runtime
+            # knob, so align it with config.py (and the JSON path) here.
+            # Chroma < 1.0 has no `configuration` kwarg; keep its defaults.
+            try:
+                col.modify(configuration={"hnsw": {"ef_search": CHROMA_METADATA["hnsw:search_ef"]}})
+            except TypeError:
+                pass
+            sentinel.write_text(str(n))
+            return client, col
+    json_path = kb_dir / "kb_export.json"
+    data = _load_kb_export(str(json_path), json_path.stat().st_mtime)
+    # Vectors live in a float16 binary sidecar; widen once for Chroma
+    embeddings = np.load(kb_dir / "kb_embeddings.npy").astype(np.float32)
     col = client.get_or_create_collection(
         name=CHROMA_COLLECTION,
-        metadata={"hnsw:space": "cosine"},
+        metadata=CHROMA_METADATA,
     )
-    batch = 100
+    # One upsert for the whole KB; only split if it exceeds Chroma's own limit
+    batch = client.get_max_batch_size()
     for i in range(0, len(data["ids"]), batch):
         col.upsert(
             ids=data["ids"][i:i+batch],
             documents=data["documents"][i:i+batch],
             metadatas=data["metadatas"][i:i+batch],
-            embeddings=data["embeddings"][i:i+batch],
+            embeddings=embeddings[i:i+batch],
         )
-    return tmp_dir
-
-db_path = ensure_db()
-
-import config
-config.CHROMA_DB_DIR = db_path
-import rag
-rag.CHROMA_DB_DIR = db_path
+    sentinel.write_text(str(len(data["ids"])))
+    return client, col
+
+client, collection = ensure_db()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_answer(query: str, use_rag: bool, prompt_version: str, k: int) -> dict:
+    """Memoized rag.answer(): a repeated scenario skips the embedding and Gemini calls."""
+    from rag import answer
+    return answer(
+        query=query,
+        use_rag=use_rag,
+        prompt_version=prompt_version,
+        k=k,
+        collection=collection,
+    )
 
 
 # ─────────────────────────────────────────
@@ -61,280 +127,30 @@ st.set_page_config(
 # ─────────────────────────────────────────
 # Custom CSS — Minimal Light Theme
 # ─────────────────────────────────────────
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=IBM+Plex+Sans:wght@300;400;500;600&family=IBM+Plex+Mono:wght@400;500&display=swap');
-
-    :root {
-        --bg: #ffffff;
-        --bg-subtle: #f8f9fa;
-        --bg-muted: #f1f3f5;
-        --border: #e9ecef;
-        --border-strong: #dee2e6;
-        --text: #1a1a1a;
-        --text-secondary: #495057;
-        --text-muted: #868e96;
-        --text-faint: #adb5bd;
-        --accent: #1a1a1a;
-        --accent-hover: #343a40;
-        --green: #2b8a3e;
-        --green-bg: #ebfbee;
-        --tag-bg: #f1f3f5;
-        --tag-border: #dee2e6;
-    }
-
-    /* ── Global ── */
-    .stApp, [data-testid="stAppViewContainer"] {
-        background-color: var(--bg) !important;
-        font-family: 'IBM Plex Sans', -apple-system, BlinkMacSystemFont, sans-serif !important;
-    }
-    .stApp { color: var(--text) !important; }
-
-    header[data-testid="stHeader"] { background: transparent !important; }
-    #MainMenu, footer, [data-testid="stDecoration"] { display: none !important; }
-    [data-testid="stSidebarCollapsedControl"] { display: none !important; }
-    [data-testid="stSidebarCollapsedControl"] { display: none !important; }
-    [data-testid="stSidebarCollapsedControl"] { display: none !important; }
-    [data-testid="stSidebarCollapsedControl"] { display: none !important; }
-    .block-container { padding: 2.5rem 3rem 3rem !important; max-width: 960px !important; }
-
-    h1, h2, h3, h4, p, li, span, div, label, .stMarkdown {
-        font-family: 'IBM Plex Sans', -apple-system, sans-serif !important;
-    }
-
-    /* ── Top Bar ── */
-    .topbar {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        padding-bottom: 2rem;
-        margin-bottom: 2rem;
-        border-bottom: 1px solid var(--border);
-    }
-    .topbar-left {
-        display: flex;
-        align-items: center;
-        gap: 10px;
-    }
-    .topbar-logo {
-        width: 28px; height: 28px;
-        border-radius: 7px;
-        background: var(--accent);
-        color: #fff;
-        display: flex; align-items: center; justify-content: center;
-        font-size: 0.85rem; font-weight: 600;
-    }
-    .topbar-name {
-        font-size: 0.9rem; font-weight: 600;
-        color: var(--text) !important;
-        letter-spacing: -0.01em;
-    }
-    .topbar-tags { display: flex; gap: 6px; }
-    .topbar-tag {
-        padding: 3px 10px;
-        background: var(--tag-bg);
-        border: 1px solid var(--tag-border);
-        border-radius: 5px;
-        font-size: 0.7rem;
-        font-family: 'IBM Plex Mono', monospace;
-        color: var(--text-muted) !important;
-    }
-
-    /* ── Hero ── */
-    .hero-title {
-        font-size: 1.65rem !important;
-        font-weight: 600 !important;
-        letter-spacing: -0.025em;
-        line-height: 1.25 !important;
-        margin: 0 0 8px !important;
-        color: var(--text) !important;
-    }
-    .hero-sub {
-        font-size: 0.95rem;
-        color: var(--text-muted) !important;
-        line-height: 1.6;
-        max-width: 560px;
-        margin-bottom: 2rem;
-    }
-
-    /* ── Section label ── */
-    .section-label {
-        font-size: 0.7rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.08em;
-        color: var(--text-faint) !important;
-        margin-bottom: 10px;
-    }
-
-    /* ── Scenario Buttons ── */
-    div[data-testid="stHorizontalBlock"] .stButton > button {
-        background: var(--bg) !important;
-        color: var(--text-secondary) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        font-family: 'IBM Plex Sans', sans-serif !important;
-        font-weight: 400 !important;
-        font-size: 0.82rem !important;
-        padding: 14px 16px !important;
-        text-align: left !important;
-        line-height: 1.5 !important;
-        transition: all 0.15s ease !important;
-        min-height: 90px !important;
-    }
-    div[data-testid="stHorizontalBlock"] .stButton > button:hover {
-        border-color: var(--border-strong) !important;
-        background: var(--bg-subtle) !important;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.04) !important;
-    }
-    div[data-testid="stHorizontalBlock"] .stButton > button p {
-        color: var(--text-secondary) !important;
-    }
-    div[data-testid="stHorizontalBlock"] .stButton > button strong {
-        color: var(--text) !important; font-weight: 600 !important;
-    }
-
-    /* ── Input ── */
-    .stTextArea textarea {
-        background: var(--bg) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        color: var(--text) !important;
-        font-family: 'IBM Plex Sans', sans-serif !important;
-        font-size: 0.9rem !important;
-        padding: 14px !important;
-        line-height: 1.6 !important;
-        transition: border-color 0.15s ease !important;
-    }
-    .stTextArea textarea:focus {
-        border-color: var(--accent) !important;
-        box-shadow: 0 0 0 1px var(--accent) !important;
-    }
-    .stTextArea textarea::placeholder { color: var(--text-faint) !important; }
-    .stTextArea label { display: none !important; }
-
-    /* ── Primary Button ── */
-    .stButton > button[kind="primary"] {
-        background: var(--accent) !important;
-        color: #fff !important;
-        border: none !important;
-        border-radius: 7px !important;
-        font-family: 'IBM Plex Sans', sans-serif !important;
-        font-weight: 500 !important;
-        font-size: 0.85rem !important;
-        padding: 0.55rem 1.4rem !important;
-        transition: all 0.15s ease !important;
-    }
-    .stButton > button[kind="primary"]:hover {
-        background: var(--accent-hover) !important;
-    }
-
-    /* ── Result ── */
-    .result-card {
-        background: var(--bg-subtle);
-        border: 1px solid var(--border);
-        border-radius: 10px;
-        padding: 24px 28px 8px;
-        margin-top: 1.5rem;
-    }
-    .result-header {
-        display: flex;
-        align-items: center;
-        gap: 8px;
-        margin-bottom: 16px;
-        padding-bottom: 14px;
-        border-bottom: 1px solid var(--border);
-    }
-    .result-dot {
-        width: 8px; height: 8px;
-        border-radius: 50%;
-        background: var(--green);
-    }
-    .result-label {
-        font-size: 0.72rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.06em;
-        color: var(--green) !important;
-    }
-
-    /* ── Sources ── */
-    .streamlit-expanderHeader {
-        background: var(--bg-subtle) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        font-size: 0.82rem !important;
-        color: var(--text-muted) !important;
-    }
-    .streamlit-expanderContent {
-        background: var(--bg) !important;
-        border: 1px solid var(--border) !important;
-        border-top: none !important;
-        border-radius: 0 0 8px 8px !important;
-    }
-    .source-row {
-        display: flex; align-items: baseline; gap: 10px;
-        padding: 6px 0; font-size: 0.8rem;
-    }
-    .source-id {
-        font-family: 'IBM Plex Mono', monospace;
-        font-size: 0.73rem;
-        color: var(--text-muted) !important;
-        background: var(--tag-bg);
-        padding: 2px 8px; border-radius: 4px;
-        white-space: nowrap;
-    }
-    .source-score {
-        font-family: 'IBM Plex Mono', monospace;
-        font-size: 0.72rem;
-        color: var(--green) !important;
-        font-weight: 500;
-    }
-    .source-domain {
-        font-size: 0.76rem;
-        color: var(--text-faint) !important;
-    }
-
-    /* ── Footer ── */
-    .app-footer {
-        margin-top: 3rem;
-        padding-top: 1.5rem;
-        border-top: 1px solid var(--border);
-        font-size: 0.72rem;
-        color: var(--text-faint) !important;
-        display: flex; align-items: center; justify-content: space-between;
-    }
-    .footer-tags { display: flex; gap: 6px; }
-    .footer-tag {
-        padding: 2px 8px;
-        background: var(--tag-bg);
-        border-radius: 4px;
-        font-family: 'IBM Plex Mono', monospace;
-        font-size: 0.65rem;
-        color: var(--text-faint) !important;
-    }
-
-    /* ── Sidebar ── */
-    section[data-testid="stSidebar"] {
-        background: var(--bg-subtle) !important;
-        border-right: 1px solid var(--border) !important;
-    }
-
-    hr { border-color: var(--border) !important; opacity: 0.6; }
-    .stSpinner > div { color: var(--text-muted) !important; }
-    [data-testid="stExpander"] { border: none !important; }
-    .stAlert { border-radius: 8px !important; }
-</style>
-""", unsafe_allow_html=True)
+# Fonts via <link> (not @import inside <style>) so the fetch runs in parallel with CSS parsing
+_FONTS_HTML = """
+<link rel="preconnect" href="https://fonts.googleapis.com">
+<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+<link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=IBM+Plex+Sans:wght@300;400;500;600&family=IBM+Plex+Mono:wght@400;500&display=swap">
+"""
+
+
+@st.cache_data
+def _css() -> str:
+    """Theme stylesheet, read from disk once per process."""
+    return (Path(__file__).parent / "assets" / "style.css").read_text()
+
+
+# The blank line matters: it ends the <link> HTML block, so CommonMark starts a
+# fresh <style> block that runs to </style> (blank lines in the CSS included)
+st.markdown(f"{_FONTS_HTML}\n<style>\n{_css()}</style>", unsafe_allow_html=True)
 
 
 # ─────────────────────────────────────────
 # Session state
 # ─────────────────────────────────────────
-if "query" not in st.session_state:
-    st.session_state.query = ""
-if "result" not in st.session_state:
-    st.session_state.result = None
+st.session_state.setdefault("query", "")
+st.session_state.setdefault("result", None)
 
 
 # ─────────────────────────────────────────
@@ -354,8 +170,11 @@ with st.sidebar:
 
 
 # ─────────────────────────────────────────
-# Top bar
+# Top bar + Hero
 # ─────────────────────────────────────────
+# One markdown element for the whole static header instead of four. The
+# fragments are joined without blank lines so CommonMark keeps them in a
+# single HTML block.
 rag_label = "RAG on" if use_rag else "RAG off"
 st.markdown(f"""
 <div class="topbar">
@@ -369,113 +188,121 @@ st.markdown(f"""
         <span class="topbar-tag">k={k}</span>
     </div>
 </div>
+<h1 class="hero-title">What retention action should you take?</h1>
+<p class="hero-sub">Describe a user cohort scenario. The engine retrieves evidence from curated retention research and generates a structured recommendation.</p>
+<div class="section-label">Example scenarios</div>
 """, unsafe_allow_html=True)
 
 
-# ─────────────────────────────────────────
-# Hero
-# ─────────────────────────────────────────
-st.markdown('<h1 class="hero-title">What retention action should you take?</h1>', unsafe_allow_html=True)
-st.markdown(
-    '<p class="hero-sub">Describe a user cohort scenario. The engine retrieves evidence from curated retention research and generates a structured recommendation.</p>',
-    unsafe_allow_html=True,
-)
-
-
 # ─────────────────────────────────────────
 # Example Scenarios
 # ─────────────────────────────────────────
-examples = [
-    {"label": "Engagement drop-off", "text": "A cohort has declining weekly engagement and a 10-day inactivity gap. Budget is limited. What should we do?"},
-    {"label": "Onboarding failure", "text": "New users drop off after their first session. Onboarding completion is only 30%. How do we improve retention?"},
-    {"label": "Power user decline", "text": "Power users who logged in daily now only come once a week. What's the best re-engagement strategy?"},
-    {"label": "Free tier churn", "text": "Free tier users who hit usage limits — 70% churn. How should we intervene before they hit the wall?"},
-    {"label": "Low feature adoption", "text": "We launched a new feature but adoption is 8% after 2 weeks. Users seem unaware of it. What should we do?"},
-    {"label": "Promo cohort churn", "text": "Users who signed up during a promo campaign never used the core feature. Churn is high. What should we do?"},
-]
-
-st.markdown('<div class="section-label">Example scenarios</div>', unsafe_allow_html=True)
-
-cols = st.columns(3)
-for i, ex in enumerate(examples[:6]):
-    with cols[i % 3]:
-        if st.button(f"**{ex['label']}**\n\n{ex['text'][:75]}...", key=f"ex_{i}", use_container_width=True):
-            st.session_state.query = ex["text"]
-            st.session_state.result = None
-            st.rerun()
-
-
-# ─────────────────────────────────────────
-# Input
-# ─────────────────────────────────────────
-st.markdown('<div class="section-label" style="margin-top:1.8rem;">Your scenario</div>', unsafe_allow_html=True)
-
-query = st.text_area(
-    "scenario",
-    value=st.session_state.query,
-    height=110,
-    placeholder="e.g., Users signed up during a promo campaign but never activated the core feature. 60-day churn rate is 45%...",
+def _pick_example():
+    # on_change runs before the rerun Streamlit already schedules for the click
+    label = st.session_state.example
+    if label:
+        st.session_state.query = EXAMPLE_TEXTS[EXAMPLE_LABELS.index(label)]
+        st.session_state.result = None
+
+
+# One pills widget instead of a 3-column grid of six buttons
+st.pills(
+    "Example scenarios",
+    EXAMPLE_LABELS,
+    key="example",
+    on_change=_pick_example,
     label_visibility="collapsed",
 )
 
-run = st.button("Generate recommendation", type="primary")
-
 
 # ─────────────────────────────────────────
-# Generate
+# Input → Generate → Result
 # ─────────────────────────────────────────
-if run:
-    if not query.strip():
-        st.warning("Enter a scenario first.")
-    else:
-        with st.spinner("Retrieving context and generating recommendation..."):
-            result = answer(
-                query=query.strip(),
-                use_rag=use_rag,
-                prompt_version=prompt_version,
-                k=k,
-            )
-            st.session_state.result = result
-            st.session_state.query = query
+def _render_sources(chunks: list[dict]) -> str:
+    """HTML for the retrieved-sources list, as one markdown blob (not 3 elements per chunk)."""
+    html_parts = ['<div class="sources">']
+    for c in chunks:
+        preview = c["text"][:200] + "..." if len(c["text"]) > 200 else c["text"]
+        domain = urlparse(c["ref"]).netloc or c["ref"][:40]
+        html_parts.append(
+            f'<div class="source-row">'
+            f'<span class="source-id">{escape(c["chunk_id"])}</span>'
+            f'<span class="source-score">{c["score"]:.3f}</span>'
+            f'<span class="source-domain">{escape(domain)}</span>'
+            f'</div>'
+            f'<p class="source-preview">{escape(preview)}</p>'
+            f'<hr/>'
+        )
+    html_parts.append("</div>")
+    return "".join(html_parts)
 
 
-# ─────────────────────────────────────────
-# Display Result
-# ─────────────────────────────────────────
-if st.session_state.result:
-    result = st.session_state.result
-
-    st.markdown("""
-    <div class="result-card">
+def _render_result(result: dict):
+    """Result card, answer and sources; rendered from session_state inside the panel fragment."""
+    # A keyed container is the card (styled via .st-key-result-card), so the
+    # answer really sits inside it instead of after a closed <div>
+    with st.container(key="result-card"):
+        st.markdown("""
         <div class="result-header">
             <div class="result-dot"></div>
             <span class="result-label">Recommendation</span>
         </div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    st.markdown(result["answer"])
+        """, unsafe_allow_html=True)
+        st.markdown(result["answer"])
 
     if result.get("chunks"):
         with st.expander(f"Retrieved sources  ·  {len(result['chunks'])} chunks"):
-            for c in result["chunks"]:
-                domain = c["ref"].split("/")[2] if "://" in c["ref"] else c["ref"][:40]
-                st.markdown(
-                    f'<div class="source-row">'
-                    f'<span class="source-id">{c["chunk_id"]}</span>'
-                    f'<span class="source-score">{c["score"]:.3f}</span>'
-                    f'<span class="source-domain">{domain}</span>'
-                    f'</div>',
-                    unsafe_allow_html=True,
+            st.markdown(result["_rendered_sources"], unsafe_allow_html=True)
+
+
+@st.fragment
+def _generate_panel(use_rag: bool, prompt_version: str, k: int):
+    """Scenario input, Generate button and result card.
+
+    Runs as a fragment: typing or clicking Generate only reruns this panel,
+    not the CSS, top bar and example cards above it. Sidebar settings still
+    trigger a full rerun (the top bar tags depend on them) and arrive as args.
+    """
+    st.markdown('<div class="section-label" style="margin-top:1.8rem;">Your scenario</div>', unsafe_allow_html=True)
+
+    query = st.text_area(
+        "scenario",
+        value=st.session_state.query,
+        height=110,
+        placeholder="e.g., Users signed up during a promo campaign but never activated the core feature. 60-day churn rate is 45%...",
+        label_visibility="collapsed",
+    )
+
+    run = st.button("Generate recommendation", type="primary")
+
+    # Generate
+    if run:
+        if not query.strip():
+            st.warning("Enter a scenario first.")
+        else:
+            with st.spinner("Retrieving context and generating recommendation..."):
+                result = _cached_answer(
+                    query=query.strip(),
+                    use_rag=use_rag,
+                    prompt_version=prompt_version,
+                    k=k,
                 )
-                st.caption(c["text"][:200] + "...")
-                st.markdown("---")
+                # Render the source list once; the result then sits in session_state across reruns
+                result["_rendered_sources"] = _render_sources(result["chunks"])
+                st.session_state.result = result
+                st.session_state.query = query
+
+    if st.session_state.result:
+        _render_result(st.session_state.result)
+
+
+_generate_panel(use_rag, prompt_version, k)
 
 
 # ─────────────────────────────────────────
 # Footer
 # ─────────────────────────────────────────
-st.markdown(f"""
+st.markdown("""
 <div class="app-footer">
     <span>Retention Decision Twin</span>
     <div class="footer-tags">
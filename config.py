@@ -15,6 +15,7 @@ except:
 GEN_MODEL = "models/gemini-2.0-flash-lite"          # generation
 EVAL_MODEL = "models/gemini-2.0-flash-lite"          # LLM-as-judge
 EMBED_MODEL = "models/gemini-embedding-001"       # embeddings (768-d)
+GEMINI_RPM = 95                                    # requests/min budget (quota is 100)
 
 # ──────────────────────────────────────────────
 # Chunking
@@ -29,6 +30,16 @@ TOP_K = 5               # number of chunks to retrieve
 CHROMA_COLLECTION = "retention_kb"
 CHROMA_DB_DIR = "chroma_db"
 
+# HNSW index settings, pinned so the KB doesn't drift with Chroma's defaults.
+# Small-corpus preset: for ~100s of chunks a low search_ef costs no recall,
+# and a higher M would only waste memory.
+CHROMA_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 40,
+}
+
 # ──────────────────────────────────────────────
 # Decision Twin specification
 # ──────────────────────────────────────────────
@@ -69,3 +80,28 @@ EVAL_QUERIES = [
     "Our reactivation emails have a 2% conversion rate. A cohort of 50k lapsed users hasn't engaged in 60+ days. Worth re-engaging?",
     "We launched a new feature but adoption is only 8% after 2 weeks. Existing users seem unaware of it. What should we do?",
 ]
+
+
+# ──────────────────────────────────────────────
+# UI example scenarios (Streamlit example pills)
+# ──────────────────────────────────────────────
+# Built here rather than in app.py: Streamlit re-executes app.py on every
+# rerun, while this module is imported once per process.
+# Parallel tuples: the pills widget takes EXAMPLE_LABELS as-is and the
+# on_change callback indexes EXAMPLE_TEXTS by position.
+EXAMPLE_LABELS = (
+    "Engagement drop-off",
+    "Onboarding failure",
+    "Power user decline",
+    "Free tier churn",
+    "Low feature adoption",
+    "Promo cohort churn",
+)
+EXAMPLE_TEXTS = (
+    "A cohort has declining weekly engagement and a 10-day inactivity gap. Budget is limited. What should we do?",
+    "New users drop off after their first session. Onboarding completion is only 30%. How do we improve retention?",
+    "Power users who logged in daily now only come once a week. What's the best re-engagement strategy?",
+    "Free tier users who hit usage limits — 70% churn. How should we intervene before they hit the wall?",
+    "We launched a new feature but adoption is 8% after 2 weeks. Users seem unaware of it. What should we do?",
+    "Users who signed up during a promo campaign never used the core feature. Churn is high. What should we do?",
+)
@@ -8,13 +8,18 @@ a summary report with aggregate metrics.
 Usage:
     python evaluate.py                  # run full evaluation
     python evaluate.py --configs rag_v2 # run specific config(s)
-    python evaluate.py --report-only    # just regenerate report from cached CSV
+    python evaluate.py --workers 2      # fewer concurrent Gemini calls
+    python evaluate.py --report-only    # just regenerate report from cached results
 """
 import argparse
+import hashlib
 import json
-import re
+import os
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import groupby
 from pathlib import Path
 
 import google.generativeai as genai
@@ -23,7 +28,8 @@ import pandas as pd
 from tqdm import tqdm
 
 from config import GEMINI_API_KEY, EVAL_MODEL, EVAL_QUERIES
-from rag import answer
+from rag import answer, configure, retrieve
+from throttle import gemini_limiter, gemini_retry
 
 genai.configure(api_key=GEMINI_API_KEY)
 
@@ -32,7 +38,7 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Evaluation rubric (LLM-as-judge prompt)
 # ──────────────────────────────────────────────
 
-EVAL_RUBRIC = """You are an expert evaluator for a Retention Decision Twin — an AI system that recommends retention actions for user cohorts.
+_RUBRIC_DIMENSIONS = """You are an expert evaluator for a Retention Decision Twin — an AI system that recommends retention actions for user cohorts.
 
 Score the following RESPONSE to the given QUERY on each dimension (1-5 scale):
 
@@ -57,7 +63,9 @@ Score the following RESPONSE to the given QUERY on each dimension (1-5 scale):
    - 1 = Vague platitudes with no clear next step
    - 3 = Clear recommendation but missing nuance
    - 5 = Specific, practical, includes risks/trade-offs and missing info
+"""
 
+EVAL_RUBRIC = _RUBRIC_DIMENSIONS + """
 QUERY:
 {query}
 
@@ -71,13 +79,101 @@ Respond with ONLY a JSON object (no markdown, no backticks):
 {{"relevance": <int>, "faithfulness": <int>, "citation_quality": <int>, "actionability": <int>, "brief_justification": "<1-2 sentence explanation>"}}
 """
 
+# Several (query, response, context) items in one judge call. Each ITEM is
+# scored independently with the same rubric; the answer is a JSON array.
+EVAL_RUBRIC_BATCH = _RUBRIC_DIMENSIONS + """
+There are {n} ITEMS below. Score each ITEM's RESPONSE against its own QUERY and CONTEXT only.
+
+{items}
+
+Respond with ONLY a JSON array of {n} objects, one per ITEM, in ITEM order (no markdown, no backticks):
+[{{"relevance": <int>, "faithfulness": <int>, "citation_quality": <int>, "actionability": <int>, "brief_justification": "<1-2 sentence explanation>"}}, ...]
+"""
+
+EVAL_ITEM = """ITEM {i}:
+QUERY:
+{query}
+
+CONTEXT PROVIDED (retrieved chunks):
+{context}
+
+RESPONSE TO EVALUATE:
+{response}"""
+
 
 # ──────────────────────────────────────────────
 # LLM-as-judge scorer
 # ──────────────────────────────────────────────
 
+# Judge scores keyed by a hash of everything that goes into the judge prompt,
+# so --report-only and partial reruns don't re-score identical responses
+JUDGE_CACHE_DIR = Path(__file__).parent / ".judge_cache"
+
+
+# Batch-judged scores are keyed on the templates they were judged with, so
+# they never answer a single-item lookup (or survive a batch prompt edit)
+_BATCH_TEMPLATE = EVAL_RUBRIC_BATCH + EVAL_ITEM
+
+
+def _judge_cache_path(query: str, response: str, context: str, template: str = EVAL_RUBRIC) -> Path:
+    # The prompt template and model are part of the key: editing either invalidates
+    payload = json.dumps(
+        {"q": query, "r": response, "c": context, "rubric": template, "model": EVAL_MODEL},
+        sort_keys=True,
+    )
+    key = hashlib.sha256(payload.encode()).hexdigest()[:32]
+    return JUDGE_CACHE_DIR / f"{key}.json"
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _parse_json(text: str, opener: str = "{"):
+    # Decode the first JSON value starting at `opener`; markdown fences or
+    # prose around it ("Here is the result: {...}") are simply skipped
+    start = text.find(opener)
+    if start < 0:
+        raise ValueError(f"no JSON {opener!r} in judge output")
+    return _JSON_DECODER.raw_decode(text, start)[0]
+
+
+def _validate_scores(scores: dict) -> dict:
+    # Validate scores are in 1-5 range
+    for dim in ["relevance", "faithfulness", "citation_quality", "actionability"]:
+        scores[dim] = max(1, min(5, int(scores[dim])))
+    return scores
+
+
+def _save_scores(cache_path: Path, scores: dict) -> None:
+    # Only successful scores are cached; the error fallback is not.
+    # Write a temp file and rename it into place, so a concurrent reader (or
+    # the next run, after a kill) never sees a half-written entry.
+    JUDGE_CACHE_DIR.mkdir(exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=JUDGE_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(scores))
+        os.replace(tmp, cache_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _load_scores(cache_path: Path) -> dict | None:
+    # A missing, unreadable or invalid entry is a cache miss, not an error
+    try:
+        return _validate_scores(json.loads(cache_path.read_text()))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
 def score_response(query: str, response: str, context: str = "") -> dict:
-    """Use an LLM to evaluate a single response on 4 dimensions."""
+    """Use an LLM to evaluate a single response on 4 dimensions (cached on disk)."""
+    cache_path = _judge_cache_path(query, response, context)
+    cached = _load_scores(cache_path)
+    if cached is not None:
+        return cached
+
     model = genai.GenerativeModel(EVAL_MODEL)
     prompt = EVAL_RUBRIC.format(
         query=query,
@@ -87,26 +183,84 @@ def score_response(query: str, response: str, context: str = "") -> dict:
 
     for attempt in range(3):
         try:
+            gemini_limiter.acquire()
             result = model.generate_content(prompt)
-            text = result.text.strip()
-            # Strip markdown fences if present
-            text = re.sub(r"^```json\s*", "", text)
-            text = re.sub(r"\s*```$", "", text)
-            scores = json.loads(text)
-            # Validate scores are in 1-5 range
-            for dim in ["relevance", "faithfulness", "citation_quality", "actionability"]:
-                scores[dim] = max(1, min(5, int(scores[dim])))
+            scores = _validate_scores(_parse_json(result.text))
+            _save_scores(cache_path, scores)
             return scores
         except Exception as e:
             if attempt < 2:
                 time.sleep(2 ** (attempt + 1))
             else:
                 print(f"  ⚠ Scoring failed: {e}. Using default scores.")
-                return {
-                    "relevance": 0, "faithfulness": 0,
-                    "citation_quality": 0, "actionability": 0,
-                    "brief_justification": f"Scoring error: {e}",
-                }
+                return _error_scores(e)
+
+
+def _error_scores(e: Exception) -> dict:
+    # All-zero scores flag a failed judgment in the report; never cached
+    return {
+        "relevance": 0, "faithfulness": 0,
+        "citation_quality": 0, "actionability": 0,
+        "brief_justification": f"Scoring error: {e}",
+    }
+
+
+@gemini_retry
+def _call_judge(prompt: str) -> str:
+    """Call the judge model, retrying rate-limit and unavailable errors."""
+    gemini_limiter.acquire()
+    return genai.GenerativeModel(EVAL_MODEL).generate_content(prompt).text
+
+
+def score_batch(items: list[tuple[str, str, str]]) -> list[dict]:
+    """
+    Score several (query, response, context) items with one judge call.
+
+    Cached items are skipped; the rest go out in a single batch prompt, and
+    their scores are cached under the batch templates (not the single-item
+    rubric). The call retries quota errors like generation does; if it still
+    fails, the items get default scores. Only an unparsable reply (or the
+    wrong number of objects) falls back to score_response() per item.
+    """
+    results = [None] * len(items)
+    todo = []
+    for n, (query, response, context) in enumerate(items):
+        results[n] = _load_scores(_judge_cache_path(query, response, context, _BATCH_TEMPLATE))
+        if results[n] is None:
+            todo.append(n)
+    if not todo:
+        return results
+
+    prompt = EVAL_RUBRIC_BATCH.format(
+        n=len(todo),
+        items="\n---\n".join(
+            EVAL_ITEM.format(i=i, query=items[n][0], context=items[n][2] or "(none - no RAG)", response=items[n][1])
+            for i, n in enumerate(todo, 1)
+        ),
+    )
+    try:
+        text = _call_judge(prompt)
+    except Exception as e:
+        # Re-sending each item would multiply calls against a spent quota
+        print(f"  ⚠ Batch scoring failed: {e}. Using default scores.")
+        for n in todo:
+            results[n] = _error_scores(e)
+        return results
+
+    try:
+        batch = _parse_json(text, "[")
+        if not isinstance(batch, list) or len(batch) != len(todo):
+            raise ValueError(f"expected {len(todo)} score objects, got {len(batch)}")
+        for n, scores in zip(todo, batch):
+            results[n] = _validate_scores(scores)
+            _save_scores(_judge_cache_path(*items[n], _BATCH_TEMPLATE), results[n])
+        return results
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"  ⚠ Unusable batch scores: {e}. Scoring items one by one.")
+
+    for n in todo:
+        results[n] = score_response(*items[n])
+    return results
 
 
 # ──────────────────────────────────────────────
@@ -121,70 +275,178 @@ CONFIGS = {
 }
 
 
-def run_evaluation(config_names: list[str] | None = None) -> pd.DataFrame:
-    """Run evaluation across configs and queries. Returns results DataFrame."""
-    configs_to_run = config_names or list(CONFIGS.keys())
-    results = []
+# Generation and judging are network-bound, so they run on a small thread
+# pool. Pacing comes from the shared gemini_limiter, which only blocks once
+# the last minute already holds GEMINI_RPM calls.
+MAX_WORKERS = 4
+
+# Responses scored per judge call (see score_batch)
+JUDGE_BATCH_SIZE = 4
+
+
+# Column order and dtypes of the results frame / CSV
+RESULT_DTYPES = {
+    "config": "string[pyarrow]",
+    "use_rag": "bool[pyarrow]",
+    "prompt_version": "string[pyarrow]",
+    "query_idx": "int16[pyarrow]",
+    "query": "string[pyarrow]",
+    "answer": "string[pyarrow]",
+    "num_chunks": "int16[pyarrow]",
+    "top_chunk_score": "double[pyarrow]",
+    "relevance": "int8[pyarrow]",
+    "faithfulness": "int8[pyarrow]",
+    "citation_quality": "int8[pyarrow]",
+    "actionability": "int8[pyarrow]",
+    "brief_justification": "string[pyarrow]",
+}
+# Filled from the judge's score dicts rather than the generated rows
+SCORE_COLUMNS = ("relevance", "faithfulness", "citation_quality", "actionability", "brief_justification")
 
-    total = len(configs_to_run) * len(EVAL_QUERIES)
-    pbar = tqdm(total=total, desc="Evaluating")
 
-    for config_name in configs_to_run:
-        cfg = CONFIGS[config_name]
-        print(f"\n{'='*60}")
-        print(f"Config: {config_name}  (RAG={cfg['use_rag']}, prompt={cfg['prompt_version']})")
-        print(f"{'='*60}")
-
-        for i, query in enumerate(EVAL_QUERIES):
-            pbar.set_postfix(config=config_name, query=i + 1)
-
-            # Generate response
-            result = answer(query, use_rag=cfg["use_rag"], prompt_version=cfg["prompt_version"])
-
-            # Build context string for judge
-            context_for_judge = ""
-            if result["chunks"]:
-                context_for_judge = "\n".join(
-                    f"[{c['chunk_id']}]: {c['text'][:200]}..." for c in result["chunks"]
-                )
-
-            # Score with LLM judge
-            scores = score_response(query, result["answer"], context_for_judge)
-
-            results.append({
-                "config": config_name,
-                "use_rag": cfg["use_rag"],
-                "prompt_version": cfg["prompt_version"],
-                "query_idx": i,
-                "query": query,
-                "answer": result["answer"],
-                "num_chunks": len(result["chunks"]),
-                "top_chunk_score": result["chunks"][0]["score"] if result["chunks"] else None,
-                **{k: v for k, v in scores.items()},
-            })
+def _generate_one(config_name: str, i: int, query: str, chunks: list[dict] | None) -> dict:
+    """Answer one query under one config; returns the result row minus scores."""
+    cfg = CONFIGS[config_name]
+
+    # Generate response (RAG configs reuse the query's shared retrieval)
+    result = answer(query, use_rag=cfg["use_rag"], prompt_version=cfg["prompt_version"], chunks=chunks)
+
+    # Build context string for judge
+    context_for_judge = ""
+    if result["chunks"]:
+        context_for_judge = "\n".join(
+            f"[{c['chunk_id']}]: {c['text'][:200]}..." for c in result["chunks"]
+        )
+
+    return {
+        "config": config_name,
+        "use_rag": cfg["use_rag"],
+        "prompt_version": cfg["prompt_version"],
+        "query_idx": i,
+        "query": query,
+        "answer": result["answer"],
+        "num_chunks": len(result["chunks"]),
+        "top_chunk_score": result["chunks"][0]["score"] if result["chunks"] else None,
+        "_context": context_for_judge,
+    }
+
+
+def _score_rows(rows: list[dict], batched: bool) -> list[dict]:
+    """Judge one batch of generated rows (one row per call when not batched)."""
+    items = [(r["query"], r["answer"], r["_context"]) for r in rows]
+    if not batched:
+        return [score_response(*item) for item in items]
+    return score_batch(items)
+
+
+def _run_pool(pool: ThreadPoolExecutor, fn, jobs: list[tuple], desc: str) -> list:
+    """Run fn(*job) for every job on the pool; results come back in job order."""
+    results = [None] * len(jobs)
+    futures = {pool.submit(fn, *job): n for n, job in enumerate(jobs)}
+    with tqdm(total=len(jobs), desc=desc) as pbar:
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
             pbar.update(1)
+    return results
 
-            # Rate limit courtesy
-            time.sleep(8)
 
-    pbar.close()
-    return pd.DataFrame(results)
+def run_evaluation(
+    config_names: list[str] | None = None,
+    max_workers: int = MAX_WORKERS,
+    judge_batch_size: int = JUDGE_BATCH_SIZE,
+) -> pd.DataFrame:
+    """Run evaluation across configs and queries. Returns results DataFrame."""
+    configs_to_run = config_names or list(CONFIGS.keys())
+    for config_name in configs_to_run:
+        cfg = CONFIGS[config_name]
+        print(f"Config: {config_name}  (RAG={cfg['use_rag']}, prompt={cfg['prompt_version']})")
+    use_rag = any(CONFIGS[c]["use_rag"] for c in configs_to_run)
+
+    # Open the ChromaDB collection once up front rather than racing to do it
+    # lazily from several worker threads
+    if use_rag:
+        configure()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # rag_v1 and rag_v2 see identical context, so retrieve (one embed
+        # call + one Chroma query) once per query and share the chunks
+        retrieved = [None] * len(EVAL_QUERIES)
+        if use_rag:
+            retrieved = _run_pool(pool, retrieve, [(q,) for q in EVAL_QUERIES], "Retrieving")
+        tasks = [
+            (config_name, i, query, retrieved[i] if CONFIGS[config_name]["use_rag"] else None)
+            for config_name in configs_to_run
+            for i, query in enumerate(EVAL_QUERIES)
+        ]
+        rows = _run_pool(pool, _generate_one, tasks, "Generating")
+        # Judge in fixed-size batches that never cross a config boundary, so
+        # a response is only ever scored next to answers from its own config.
+        # rows are config-major, so grouping consecutive rows keeps row order.
+        batches = []
+        for _, group in groupby(rows, key=lambda r: r["config"]):
+            config_rows = list(group)
+            batches.extend(
+                (config_rows[i:i + judge_batch_size], judge_batch_size > 1)
+                for i in range(0, len(config_rows), judge_batch_size)
+            )
+        batch_scores = _run_pool(pool, _score_rows, batches, "Judging")
+
+    scores = [s for batch in batch_scores for s in batch]
+    # Build the frame column by column with explicit Arrow dtypes: no
+    # per-row dtype inference, and 1-5 scores stored as int8
+    columns = {**{col: [r[col] for r in rows] for col in RESULT_DTYPES if col not in SCORE_COLUMNS},
+               **{col: [s.get(col) for s in scores] for col in SCORE_COLUMNS}}
+    return pd.DataFrame({
+        col: pd.array(columns[col], dtype=dtype) for col, dtype in RESULT_DTYPES.items()
+    })
 
 
 # ──────────────────────────────────────────────
 # Report generation
 # ──────────────────────────────────────────────
 
+def _config_stats(configs: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Mean and sample std (ddof=1, like pandas) of each `values` column per config.
+
+    Rows are sorted by config once, then every group is reduced with
+    np.add.reduceat over contiguous memory. Returns (sorted labels, means, stds),
+    each row aligned with its label; a single-row group has NaN std.
+    """
+    order = np.argsort(configs, kind="stable")
+    cfg, vals = configs[order], values[order]
+    starts = np.flatnonzero(np.r_[True, cfg[1:] != cfg[:-1]])
+    counts = np.diff(np.r_[starts, len(cfg)])[:, None]
+
+    means = np.add.reduceat(vals, starts, axis=0) / counts
+    # Two-pass variance: subtract each row's group mean, then reduce again
+    sq_dev = (vals - np.repeat(means, counts.ravel(), axis=0)) ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stds = np.sqrt(np.add.reduceat(sq_dev, starts, axis=0) / (counts - 1))
+    stds[counts.ravel() == 1] = np.nan
+    return cfg[starts], means, stds
+
+
 def generate_report(df: pd.DataFrame) -> str:
     """Generate a markdown evaluation report."""
     dims = ["relevance", "faithfulness", "citation_quality", "actionability"]
 
-    # Aggregate by config
-    agg = df.groupby("config")[dims].agg(["mean", "std"]).round(2)
-
     # Composite score
-    df["composite"] = df[dims].mean(axis=1)
-    composite_agg = df.groupby("config")["composite"].agg(["mean", "std"]).round(2)
+    df["composite"] = df[dims].to_numpy(dtype=float).mean(axis=1)
+
+    # Per-config mean/std of every dimension and the composite in one NumPy
+    # pass; the unrounded means feed the comparisons below, the rounded
+    # table feeds the report
+    cols = dims + ["composite"]
+    labels, mean, std = _config_stats(df["config"].to_numpy(dtype=str), df[cols].to_numpy(dtype=float))
+    stats = pd.DataFrame(
+        np.stack([mean, std], axis=2).reshape(len(labels), -1),
+        index=pd.Index(labels, name="config"),
+        columns=pd.MultiIndex.from_product([cols, ["mean", "std"]]),
+    )
+    means = stats.xs("mean", axis=1, level=1)
+    agg = stats.round(2)
+    composite_agg = agg["composite"]
 
     lines = [
         "# Decision Twin RAG - Evaluation Report",
@@ -231,15 +493,15 @@ def generate_report(df: pd.DataFrame) -> str:
         lines.append(f"- **RAG v2 vs No-RAG v1 improvement:** +{improvement:.2f} ({pct:.1f}%)")
 
     # RAG vs NoRAG comparison
-    if all(c in df["config"].values for c in ["norag_v2", "rag_v2"]):
-        rag_mean = df[df["config"] == "rag_v2"]["composite"].mean()
-        norag_mean = df[df["config"] == "norag_v2"]["composite"].mean()
+    if all(c in means.index for c in ["norag_v2", "rag_v2"]):
+        rag_mean = means.loc["rag_v2", "composite"]
+        norag_mean = means.loc["norag_v2", "composite"]
         lines.append(f"- **RAG effect (v2 prompt):** +{rag_mean - norag_mean:.2f} composite points")
 
     # v1 vs v2 comparison
-    if all(c in df["config"].values for c in ["rag_v1", "rag_v2"]):
-        v1_mean = df[df["config"] == "rag_v1"]["composite"].mean()
-        v2_mean = df[df["config"] == "rag_v2"]["composite"].mean()
+    if all(c in means.index for c in ["rag_v1", "rag_v2"]):
+        v1_mean = means.loc["rag_v1", "composite"]
+        v2_mean = means.loc["rag_v2", "composite"]
         lines.append(f"- **Prompt engineering effect (RAG):** +{v2_mean - v1_mean:.2f} composite points")
 
     lines.extend([
@@ -247,9 +509,10 @@ def generate_report(df: pd.DataFrame) -> str:
         "## Per-Dimension Breakdown",
         "",
     ])
+    best_configs = means[dims].idxmax()
     for dim in dims:
-        best_config = df.groupby("config")[dim].mean().idxmax()
-        best_score = df[df["config"] == best_config][dim].mean()
+        best_config = best_configs[dim]
+        best_score = means.loc[best_config, dim]
         lines.append(
             f"- **{dim.replace('_', ' ').title()}:** Best = `{best_config}` ({best_score:.2f})"
         )
@@ -272,31 +535,54 @@ def generate_report(df: pd.DataFrame) -> str:
 # Main
 # ──────────────────────────────────────────────
 
+def _positive_int(value: str) -> int:
+    """argparse type: reject 0 / negatives up front, before any API spend."""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return n
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate Decision Twin RAG")
     parser.add_argument(
         "--configs", nargs="*", choices=list(CONFIGS.keys()), default=None,
         help="Which configs to run (default: all)"
     )
+    parser.add_argument(
+        "--workers", type=_positive_int, default=MAX_WORKERS,
+        help=f"Concurrent (config, query) evaluations (default: {MAX_WORKERS})"
+    )
+    parser.add_argument(
+        "--judge-batch", type=_positive_int, default=JUDGE_BATCH_SIZE,
+        help=f"Responses scored per judge call; 1 disables batching (default: {JUDGE_BATCH_SIZE})"
+    )
     parser.add_argument(
         "--report-only", action="store_true",
-        help="Regenerate report from cached CSV"
+        help="Regenerate report from cached results"
     )
     args = parser.parse_args()
 
-    results_path = Path(__file__).parent / "eval_results.csv"
+    # Parquet is the cache --report-only reads (typed, compressed); the CSV
+    # copy stays for spreadsheets and diffing
+    results_path = Path(__file__).parent / "eval_results.parquet"
+    csv_path = Path(__file__).parent / "eval_results.csv"
     report_path = Path(__file__).parent / "eval_report.md"
 
     if args.report_only:
         if results_path.exists():
-            df = pd.read_csv(results_path)
+            df = pd.read_parquet(results_path)
+        elif csv_path.exists():
+            # Results from before the Parquet cache existed
+            df = pd.read_csv(csv_path)
         else:
             print("❌ No cached results found. Run evaluation first.")
             exit(1)
     else:
-        df = run_evaluation(args.configs)
-        df.to_csv(results_path, index=False)
-        print(f"\n📊  Results saved to {results_path}")
+        df = run_evaluation(args.configs, max_workers=args.workers, judge_batch_size=args.judge_batch)
+        df.to_parquet(results_path, engine="pyarrow", compression="zstd", index=False)
+        df.to_csv(csv_path, index=False)
+        print(f"\n📊  Results saved to {results_path} (+ {csv_path.name})")
 
     report = generate_report(df)
     report_path.write_text(report)
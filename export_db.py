@@ -4,16 +4,20 @@ import numpy as np
 from config import CHROMA_COLLECTION, CHROMA_DB_DIR
 from pathlib import Path
 
-client = chromadb.PersistentClient(path=str(Path(__file__).parent / CHROMA_DB_DIR))
+kb_dir = Path(__file__).parent
+client = chromadb.PersistentClient(path=str(kb_dir / CHROMA_DB_DIR))
 col = client.get_collection(CHROMA_COLLECTION)
 data = col.get(include=["documents", "metadatas", "embeddings"])
 
+# Vectors go to a binary sidecar; the JSON only carries text + metadata.
+# Stored as float16 (half the bytes); top-k cosine ranking is unchanged.
+# Both files land next to this script, where app.py's ensure_db() reads them.
+np.save(kb_dir / "kb_embeddings.npy", np.asarray(data["embeddings"], dtype=np.float16))
 export = {
     "ids": data["ids"],
     "documents": data["documents"],
     "metadatas": data["metadatas"],
-    "embeddings": [list(map(float, e)) for e in data["embeddings"]],
 }
-with open("kb_export.json", "w") as f:
+with open(kb_dir / "kb_export.json", "w") as f:
     json.dump(export, f)
-print(f"✅ Exported {len(data['ids'])} chunks to kb_export.json")
+print(f"✅ Exported {len(data['ids'])} chunks to kb_export.json + kb_embeddings.npy")
@@ -8,8 +8,8 @@ Usage:
 import argparse
 import json
 import re
-import time
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import chromadb
@@ -26,7 +26,9 @@ from config import (
     CHUNK_OVERLAP,
     CHROMA_COLLECTION,
     CHROMA_DB_DIR,
+    CHROMA_METADATA,
 )
+from throttle import gemini_limiter, gemini_retry
 
 genai.configure(api_key=GEMINI_API_KEY)
 
@@ -44,7 +46,7 @@ def fetch_web_text(url: str) -> str:
     """Scrape readable text from a URL."""
     r = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
     r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = BeautifulSoup(r.text, "lxml")  # C parser; several times faster than html.parser
     for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
         tag.decompose()
     return clean_text(soup.get_text(separator=" "))
@@ -64,78 +66,76 @@ def fetch_youtube_transcript(video_id: str) -> str:
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
     """Split text into overlapping chunks by character count."""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(len(text), start + chunk_size)
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+    # Chunk starts are a plain range; slicing already clamps the last end
+    return [text[start:start + chunk_size] for start in range(0, len(text), chunk_size - overlap)]
 
 
 # ──────────────────────────────────────────────
-# Embedding (with rate-limit retry)
+# Embedding (rate-limited, with retry)
 # ──────────────────────────────────────────────
 
-def embed_batch(texts: list[str], batch_size: int = 10) -> list[list[float]]:
-    """Embed texts with Gemini, handling rate limits gracefully."""
-    all_embeddings = []
-    for i in tqdm(range(0, len(texts), batch_size), desc="Embedding batches"):
-        batch = texts[i : i + batch_size]
-        retries = 0
-        while retries < 8:
-            try:
-                results = genai.embed_content(
-                    model=EMBED_MODEL,
-                    content=batch,
-                )
-                all_embeddings.extend(results["embedding"])
-                break
-            except Exception as e:
-                retries += 1
-                wait = min(60, 2 ** retries)
-                print(f"  Rate limit hit. Waiting {wait}s... (attempt {retries}/8)")
-                time.sleep(wait)
-        else:
-            raise RuntimeError(f"Failed to embed batch starting at index {i}")
-        # Pause between batches to stay under 100 req/min
-        time.sleep(8)
-    return all_embeddings
+EMBED_BATCH_SIZE = 100  # per-request cap of the batch embed endpoint
+
+
+@gemini_retry
+def _embed(texts: list[str]) -> list[list[float]]:
+    # Waits only when the last minute is already at GEMINI_RPM calls; the
+    # limiter sits inside the retry so every attempt counts against it
+    gemini_limiter.acquire()
+    return genai.embed_content(model=EMBED_MODEL, content=texts)["embedding"]
+
+
+def embed_batch(texts: list[str]) -> np.ndarray:
+    """Embed one batch of texts with Gemini, retrying on rate limits."""
+    # float32 matrix: half the memory of Python floats, and Chroma takes
+    # ndarrays without re-walking nested lists
+    return np.asarray(_embed(texts), dtype=np.float32)
 
 
 # ──────────────────────────────────────────────
 # Main ingestion pipeline
 # ──────────────────────────────────────────────
 
+FETCH_WORKERS = 16      # concurrent source fetches (I/O-bound)
+
+
 def ingest(reset: bool = False):
     sources_path = Path(__file__).parent / "sources.json"
     with open(sources_path) as f:
         sources = json.load(f)
 
     # -- 1. Fetch raw documents --
+    # Every fetch is a blocking network call, so they all run concurrently;
+    # results are read back in source order to keep doc/chunk order stable
+    web_urls = sources.get("web_urls", [])
+    video_ids = sources.get("youtube_video_ids", [])
     docs = []
-    print("\n📥  Fetching web sources...")
-    for i, url in enumerate(sources.get("web_urls", [])):
-        try:
-            txt = fetch_web_text(url)
-            docs.append({"doc_id": f"web_{i}", "source": "web", "ref": url, "text": txt})
-            print(f"  ✓ web_{i}: {url[:60]}...  ({len(txt):,} chars)")
-        except Exception as e:
-            print(f"  ✗ web_{i}: {url[:60]}...  -> {e}")
-
-    print("\n📥  Fetching YouTube transcripts...")
-    for j, vid in enumerate(sources.get("youtube_video_ids", [])):
-        try:
-            txt = fetch_youtube_transcript(vid)
-            docs.append({
-                "doc_id": f"yt_{j}",
-                "source": "youtube",
-                "ref": f"https://youtube.com/watch?v={vid}",
-                "text": txt,
-            })
-            print(f"  ✓ yt_{j}: {vid}  ({len(txt):,} chars)")
-        except Exception as e:
-            print(f"  ✗ yt_{j}: {vid}  -> {e}")
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        web_futures = [pool.submit(fetch_web_text, url) for url in web_urls]
+        yt_futures = [pool.submit(fetch_youtube_transcript, vid) for vid in video_ids]
+
+        print("\n📥  Fetching web sources...")
+        for i, (url, future) in enumerate(zip(web_urls, web_futures)):
+            try:
+                txt = future.result()
+                docs.append({"doc_id": f"web_{i}", "source": "web", "ref": url, "text": txt})
+                print(f"  ✓ web_{i}: {url[:60]}...  ({len(txt):,} chars)")
+            except Exception as e:
+                print(f"  ✗ web_{i}: {url[:60]}...  -> {e}")
+
+        print("\n📥  Fetching YouTube transcripts...")
+        for j, (vid, future) in enumerate(zip(video_ids, yt_futures)):
+            try:
+                txt = future.result()
+                docs.append({
+                    "doc_id": f"yt_{j}",
+                    "source": "youtube",
+                    "ref": f"https://youtube.com/watch?v={vid}",
+                    "text": txt,
+                })
+                print(f"  ✓ yt_{j}: {vid}  ({len(txt):,} chars)")
+            except Exception as e:
+                print(f"  ✗ yt_{j}: {vid}  -> {e}")
 
     if not docs:
         print("❌  No documents fetched. Check your URLs and network.")
@@ -143,52 +143,65 @@ def ingest(reset: bool = False):
 
     # -- 2. Chunk --
     print(f"\n✂️  Chunking {len(docs)} documents (size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})...")
-    all_chunks = []
+    # Parallel per-chunk lists rather than one dict per chunk; the upsert
+    # below slices them directly
+    ids, texts, doc_ids, doc_sources, refs = [], [], [], [], []
     for doc in docs:
         for k, chunk_text_ in enumerate(chunk_text(doc["text"])):
-            all_chunks.append({
-                "chunk_id": f"{doc['doc_id']}_c{k}",
-                "doc_id": doc["doc_id"],
-                "source": doc["source"],
-                "ref": doc["ref"],
-                "text": chunk_text_,
-            })
-    print(f"  -> {len(all_chunks)} chunks total")
-
-    # -- 3. Embed --
-    print(f"\n🔢  Embedding {len(all_chunks)} chunks...")
-    texts = [c["text"] for c in all_chunks]
-    embeddings = embed_batch(texts)
-
-    # -- 4. Store in ChromaDB --
+            ids.append(f"{doc['doc_id']}_c{k}")
+            texts.append(chunk_text_)
+            doc_ids.append(doc["doc_id"])
+            doc_sources.append(doc["source"])
+            refs.append(doc["ref"])
+    print(f"  -> {len(ids)} chunks total")
+
+    # -- 3. Open ChromaDB --
+    # Batches go into a sibling build dir that replaces CHROMA_DB_DIR only
+    # once every batch has been stored. A failed run (bad key, exhausted
+    # retries) leaves the existing DB, which app.py ships as its prebuilt
+    # KB, untouched -- with or without --reset.
     db_path = Path(__file__).parent / CHROMA_DB_DIR
-    if reset and db_path.exists():
-        print("🗑️  Resetting existing ChromaDB...")
-        shutil.rmtree(db_path)
+    build_path = db_path.with_name(db_path.name + ".building")
+    if build_path.exists():
+        shutil.rmtree(build_path)
+    if db_path.exists() and not reset:
+        shutil.copytree(db_path, build_path)
 
-    print(f"\n💾  Storing in ChromaDB ({CHROMA_DB_DIR})...")
-    client = chromadb.PersistentClient(path=str(db_path))
+    client = chromadb.PersistentClient(path=str(build_path))
     collection = client.get_or_create_collection(
         name=CHROMA_COLLECTION,
-        metadata={"hnsw:space": "cosine"},
+        metadata=CHROMA_METADATA,
     )
 
-    # Upsert in batches (ChromaDB handles dedup via IDs)
-    batch_size = 100
-    for i in range(0, len(all_chunks), batch_size):
-        batch = all_chunks[i : i + batch_size]
+    # -- 4. Embed + store --
+    # Each batch is upserted as soon as it is embedded, so only one batch of
+    # vectors is ever held in memory
+    print(f"\n🔢  Embedding {len(ids)} chunks into ChromaDB ({CHROMA_DB_DIR})...")
+    batch_size = min(EMBED_BATCH_SIZE, client.get_max_batch_size())
+    for i in tqdm(range(0, len(ids), batch_size), desc="Embedding batches"):
+        j = i + batch_size
         collection.upsert(
-            ids=[c["chunk_id"] for c in batch],
-            embeddings=embeddings[i : i + batch_size],
-            documents=[c["text"] for c in batch],
+            ids=ids[i:j],
+            embeddings=embed_batch(texts[i:j]),
+            documents=texts[i:j],
             metadatas=[
-                {"doc_id": c["doc_id"], "source": c["source"], "ref": c["ref"]}
-                for c in batch
+                {"doc_id": d, "source": s, "ref": r}
+                for d, s, r in zip(doc_ids[i:j], doc_sources[i:j], refs[i:j])
             ],
         )
 
-    print(f"\n✅  Done! {collection.count()} chunks in collection '{CHROMA_COLLECTION}'")
-    print(f"   Sources ingested: {len(docs)} documents -> {len(all_chunks)} chunks")
+    count = collection.count()
+    # Release Chroma's handles on the build dir before moving it into place
+    client.clear_system_cache()
+    del collection, client
+    if db_path.exists():
+        if reset:
+            print("🗑️  Resetting existing ChromaDB...")
+        shutil.rmtree(db_path)
+    build_path.rename(db_path)
+
+    print(f"\n✅  Done! {count} chunks in collection '{CHROMA_COLLECTION}'")
+    print(f"   Sources ingested: {len(docs)} documents -> {len(ids)} chunks")
 
 
 # ──────────────────────────────────────────────
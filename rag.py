@@ -6,7 +6,10 @@ Supports:
     - No-RAG baseline (generate without context)
     - Two prompt versions (v1 = simple, v2 = structured with constraints)
 """
-import time
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
 from pathlib import Path
 
 import chromadb
@@ -21,6 +24,7 @@ from config import (
     CHROMA_DB_DIR,
     DECISION_TWIN_SPEC,
 )
+from throttle import gemini_limiter, gemini_retry
 
 genai.configure(api_key=GEMINI_API_KEY)
 
@@ -29,29 +33,61 @@ genai.configure(api_key=GEMINI_API_KEY)
 # ChromaDB connection
 # ──────────────────────────────────────────────
 
+_client = None
+_collection = None
+_db_path = None
+
+
+def configure(db_path: str | None = None) -> None:
+    """
+    Point retrieval at the ChromaDB at `db_path` (default CHROMA_DB_DIR).
+
+    Relative paths resolve against this directory. Re-configuring with the
+    path that is already open is a no-op. Callers holding an open collection
+    (app.py) skip this and pass `collection=` to retrieve() / answer().
+    """
+    global _client, _collection, _db_path
+    path = Path(db_path or CHROMA_DB_DIR)
+    if not path.is_absolute():
+        path = Path(__file__).parent / path
+    if _collection is not None and str(path) == _db_path:
+        return
+    _client = chromadb.PersistentClient(path=str(path))
+    _collection = _client.get_collection(CHROMA_COLLECTION)
+    _db_path = str(path)
+
+
 def _get_collection():
-    # If CHROMA_DB_DIR is absolute (set by app.py for cloud), use directly
-    if Path(CHROMA_DB_DIR).is_absolute():
-        db_path = CHROMA_DB_DIR
-    else:
-        db_path = str(Path(__file__).parent / CHROMA_DB_DIR)
-    client = chromadb.PersistentClient(path=str(db_path))
-    return client.get_collection(CHROMA_COLLECTION)
+    if _collection is None:
+        configure()
+    return _collection
 
 
 # ──────────────────────────────────────────────
 # Retrieval
 # ──────────────────────────────────────────────
 
-def retrieve(query: str, k: int = TOP_K) -> list[dict]:
+@lru_cache(maxsize=512)
+@gemini_retry
+def _embed_query(query: str) -> tuple[float, ...]:
+    # Memoized per process: the same scenario at another k / prompt version
+    # (or an eval rerun) skips the embedding round trip. Tuples are immutable,
+    # so a cached vector can't be mutated by a caller.
+    gemini_limiter.acquire()
+    return tuple(genai.embed_content(model=EMBED_MODEL, content=query)["embedding"])
+
+
+def retrieve(query: str, k: int = TOP_K, collection=None) -> list[dict]:
     """
     Retrieve top-k chunks from ChromaDB by cosine similarity.
+    Uses `collection` if given, else the configured one (see configure()).
     Returns list of dicts with keys: chunk_id, source, ref, text, score.
     """
-    collection = _get_collection()
+    if collection is None:
+        collection = _get_collection()
 
     # Embed the query
-    q_emb = genai.embed_content(model=EMBED_MODEL, content=query)["embedding"]
+    q_emb = list(_embed_query(query))
 
     results = collection.query(
         query_embeddings=[q_emb],
@@ -138,21 +174,56 @@ User question:
 # Generation
 # ──────────────────────────────────────────────
 
+_model = None
+
+
+def _get_model():
+    # One GenerativeModel per process rather than one per request
+    global _model
+    if _model is None:
+        _model = genai.GenerativeModel(GEN_MODEL)
+    return _model
+
+
+# Generated text keyed by a hash of (model, prompt), so repeated runs of the
+# same prompt (eval reruns, rubric iteration) skip Gemini. RAG_CACHE=0 opts out.
+GEN_CACHE_DIR = Path(__file__).parent / ".gen_cache"
+GEN_CACHE_ENABLED = os.getenv("RAG_CACHE", "1") == "1"
+
+
+@gemini_retry
+def _call_model(prompt: str) -> str:
+    """Call Gemini generation, retrying rate-limit and unavailable errors."""
+    gemini_limiter.acquire()
+    return _get_model().generate_content(prompt).text
+
+
 def _generate(prompt: str) -> str:
-    """Call Gemini generation with retry."""
-    model = genai.GenerativeModel(GEN_MODEL)
-    for attempt in range(6):
+    """Generate text for a prompt, via the on-disk cache when enabled."""
+    if not GEN_CACHE_ENABLED:
+        return _call_model(prompt)
+
+    key = hashlib.sha256(f"{GEN_MODEL}\n{prompt}".encode()).hexdigest()[:32]
+    cache_path = GEN_CACHE_DIR / f"{key}.txt"
+    if cache_path.exists():
+        return cache_path.read_text()
+
+    text = _call_model(prompt)
+    try:
+        # Temp file + rename, so a concurrent reader (or the next run, after
+        # a kill) never serves a half-written answer as a cache hit
+        GEN_CACHE_DIR.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=GEN_CACHE_DIR, suffix=".tmp")
         try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            wait = min(120, 2 ** (attempt + 2))
-            if "429" in str(e) or "ResourceExhausted" in str(e):
-                print(f"  Rate limit. Waiting {wait}s... (attempt {attempt+1}/6)")
-                time.sleep(wait)
-            else:
-                raise RuntimeError(f"Generation failed after {attempt+1} attempts: {e}")
-    raise RuntimeError("Generation failed after 6 attempts: rate limit exceeded")
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp, cache_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass  # read-only checkout (e.g. a hosted app): just don't cache
+    return text
 
 
 # ──────────────────────────────────────────────
@@ -164,6 +235,8 @@ def answer(
     use_rag: bool = True,
     prompt_version: str = "v2",
     k: int = TOP_K,
+    collection=None,
+    chunks: list[dict] | None = None,
 ) -> dict:
     """
     Generate a decision twin recommendation.
@@ -173,21 +246,26 @@ def answer(
         use_rag: If True, retrieve context from ChromaDB.
         prompt_version: "v1" (simple) or "v2" (structured).
         k: Number of chunks to retrieve (only used if use_rag=True).
+        collection: Open ChromaDB collection to retrieve from; defaults to
+            the one set by configure() / CHROMA_DB_DIR.
+        chunks: Already-retrieved chunks (from retrieve()) to use as context
+            instead of retrieving again; only used if use_rag=True.
 
     Returns:
         dict with keys: answer, query, prompt_version, use_rag, chunks, prompt
     """
-    chunks = []
     context = ""
 
-    if use_rag:
-        chunks = retrieve(query, k=k)
-        context_blocks = []
-        for c in chunks:
-            context_blocks.append(
-                f"[{c['chunk_id']}] source={c['source']} ref={c['ref']}\n{c['text']}"
-            )
-        context = "\n\n".join(context_blocks)
+    if not use_rag:
+        chunks = []
+    elif chunks is None:
+        chunks = retrieve(query, k=k, collection=collection)
+
+    if chunks:
+        context = "\n\n".join(
+            f"[{c['chunk_id']}] source={c['source']} ref={c['ref']}\n{c['text']}"
+            for c in chunks
+        )
 
     if prompt_version == "v1":
         prompt = _build_prompt_v1(query, context)
@@ -0,0 +1,65 @@
+"""
+throttle.py - Client-side rate limiting and retry for Gemini API calls.
+
+RateLimiter is a sliding-window limiter: callers block only as long as
+needed to keep the last `period` seconds under `max_calls`, instead of
+sleeping a fixed amount after every request. Thread-safe, so one limiter
+can be shared by a pool.
+
+gemini_limiter is the one limiter every module acquires before a Gemini
+call: the quota is per API key, so ingest, retrieval, generation and the
+judge all draw from the same GEMINI_RPM budget.
+
+gemini_retry retries only quota/availability errors, with jittered
+exponential backoff; anything else (bad key, bad request) fails at once.
+"""
+import threading
+import time
+from collections import deque
+
+from google.api_core import exceptions, retry
+
+from config import GEMINI_RPM
+
+
+class RateLimiter:
+    """Allow at most `max_calls` acquire() calls in any `period`-second window."""
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until another call fits in the window, then record it."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                # Wait for the oldest call in the window to age out
+                time.sleep(self.period - (now - self._calls[0]))
+
+
+gemini_limiter = RateLimiter(GEMINI_RPM)
+
+
+def _log_retry(e: Exception) -> None:
+    print(f"  {type(e).__name__} from Gemini. Backing off and retrying...")
+
+
+gemini_retry = retry.Retry(
+    predicate=retry.if_exception_type(
+        exceptions.ResourceExhausted,   # 429
+        exceptions.ServiceUnavailable,  # 503
+    ),
+    initial=2.0,
+    maximum=60.0,
+    multiplier=2.0,
+    timeout=300.0,
+    on_error=_log_retry,
+)